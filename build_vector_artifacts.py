@@ -0,0 +1,74 @@
+"""Build the prebuilt vector artifact for each registered module.
+
+    python build_vector_artifacts.py [--module autism_overview]
+    python build_vector_artifacts.py --check
+
+Each artifact holds the chunks, embeddings and a manifest recording the
+source PDF hash, embedding model, chunking and a checksum of the data.
+Workers load a matching artifact instead of re-embedding the PDF.
+"""
+
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+from openai import OpenAI
+
+from modules import get_module, load_module_registry
+from utils import (build_vector_artifact, expected_artifact_metadata,
+                   load_vector_artifact)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build vector artifacts.")
+    parser.add_argument("--module", help="Only build this module.")
+    parser.add_argument("--registry", default="modules.yaml")
+    parser.add_argument(
+        "--force", action="store_true", help="Rebuild even if the artifact is current."
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Only verify the artifacts; exit non-zero if any is missing or stale.",
+    )
+    args = parser.parse_args()
+
+    load_dotenv()
+    registry = load_module_registry(args.registry)
+    module_ids = [get_module(registry, args.module)[0]] if args.module else list(registry["modules"])
+
+    if args.check:
+        stale = [
+            module_id
+            for module_id in module_ids
+            if load_vector_artifact(
+                registry["modules"][module_id]["artifact_dir"],
+                expected_artifact_metadata(registry["modules"][module_id]["content_fp"]),
+            ) is None
+        ]
+        if stale:
+            print(
+                f"ERROR: vector artifacts missing or stale for: {', '.join(stale)}. "
+                "Run `python build_vector_artifacts.py` before building the image."
+            )
+            sys.exit(1)
+        print("All vector artifacts are up to date.")
+        return
+
+    ai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    for module_id in module_ids:
+        module = registry["modules"][module_id]
+        expected_metadata = expected_artifact_metadata(module["content_fp"])
+        if not args.force and load_vector_artifact(module["artifact_dir"], expected_metadata) is not None:
+            print(f"Vector artifact for {module_id} is up to date.")
+            continue
+        manifest = build_vector_artifact(module["content_fp"], ai_client, module["artifact_dir"])
+        print(
+            f"Built vector artifact for {module_id}: {manifest['chunk_count']} chunks "
+            f"in {module['artifact_dir']}."
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,42 @@
-from sqlalchemy import text, func
+from datetime import timedelta
 
-from database.models import (AIFeedback, Answer, Question, Session, Student,
+from sqlalchemy import or_, text, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from database.models import (AIFeedback, Answer, GradingJob, ModuleCompletion,
+                             Question, QuestionStats, Session, Student,
                              StudentAnswer)
 
 
-def insert_question(question_id, question):
+def insert_question(module_id, question_id, question):
     # Check if the question already exists
     session = Session()
     existing_question = (
-        session.query(Question).filter_by(question_id=question_id).first()
+        session.query(Question)
+        .filter_by(module_id=module_id, question_id=question_id)
+        .first()
     )
     if existing_question is None:
-        new_question = Question(question_id=question_id, question=question)
+        new_question = Question(
+            module_id=module_id, question_id=question_id, question=question
+        )
         session.add(new_question)
         session.commit()
     else:
-        print(f"Question with ID {question_id} already exists. Skipping insertion.")
+        print(
+            f"Question with ID {question_id} already exists for module {module_id}. Skipping insertion."
+        )
 
 
-def insert_answer(question_id, answer):
+def insert_answer(module_id, question_id, answer):
     session = Session()
     existing_answer = (
-        session.query(Answer).filter_by(question_id=question_id, answer=answer).first()
+        session.query(Answer)
+        .filter_by(module_id=module_id, question_id=question_id, answer=answer)
+        .first()
     )
     if existing_answer is None:
-        new_answer = Answer(question_id=question_id, answer=answer)
+        new_answer = Answer(module_id=module_id, question_id=question_id, answer=answer)
         session.add(new_answer)
         session.commit()
         print(f"Inserted answer: for question ID: {question_id}")
@@ -34,9 +46,9 @@ def insert_answer(question_id, answer):
         )
 
 
-def insert_student(banner_id):
+def insert_student(banner_id, module_id):
     session = Session()
-    new_student = Student(banner_id=banner_id)
+    new_student = Student(banner_id=banner_id, module_id=module_id)
     session.add(new_student)
     session.commit()
     student_id = new_student.id  # Get the generated student ID
@@ -44,11 +56,15 @@ def insert_student(banner_id):
     return student_id
 
 
-def insert_student_answer(student_id, question_id, answer, attempt):
+def insert_student_answer(student_id, module_id, question_id, answer, attempt):
     session = Session()
     try:
         new_student_answer = StudentAnswer(
-            student_id=student_id, question_id=question_id, answer=answer, attempt=attempt
+            student_id=student_id,
+            module_id=module_id,
+            question_id=question_id,
+            answer=answer,
+            attempt=attempt,
         )
         session.add(new_student_answer)
         session.commit()
@@ -65,11 +81,87 @@ def get_student_answers(student_id):
     return answers
 
 
-def insert_ai_feedback(student_id, feedback, question_id):
+def _increment(session, model, keys, **counts):
+    # Upsert a summary row and add to its counters in a single statement
+    statement = pg_insert(model).values(**keys, **counts)
+    statement = statement.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={name: getattr(model, name) + value for name, value in counts.items()},
+    )
+    session.execute(statement)
+
+
+def _first_grade(session, student_id, module_id, question_id, attempt):
+    return (
+        session.query(AIFeedback.grade)
+        .filter_by(
+            student_id=student_id,
+            module_id=module_id,
+            question_id=question_id,
+            attempt=attempt,
+        )
+        .filter(AIFeedback.grade.isnot(None))
+        .order_by(AIFeedback.id)
+        .limit(1)
+        .scalar()
+    )
+
+
+def _update_question_stats(session, student_id, module_id, question_id, grade, attempt):
+    # Must run before the new feedback row is added to the session
+    if grade is None:
+        return
+    keys = {"module_id": module_id, "question_id": question_id, "attempt": attempt}
+    _increment(
+        session,
+        QuestionStats,
+        keys,
+        graded_count=1,
+        passed_count=int(grade == "Satisfactory"),
+    )
+    if attempt not in (1, 2):
+        return
+
+    # Grading is asynchronous, so either attempt may be graded last. Serialize
+    # per student and question so exactly one side counts the pair.
+    session.execute(
+        text("SELECT pg_advisory_xact_lock(hashtext(:key))"),
+        {"key": f"{student_id}:{module_id}:{question_id}"},
+    )
+    if _first_grade(session, student_id, module_id, question_id, attempt) is not None:
+        return
+    other_grade = _first_grade(session, student_id, module_id, question_id, 3 - attempt)
+    if other_grade is None:
+        return
+    first_grade, second_grade = (grade, other_grade) if attempt == 1 else (other_grade, grade)
+    keys["attempt"] = 2
+    _increment(
+        session,
+        QuestionStats,
+        keys,
+        paired_count=1,
+        improved_count=int(first_grade != "Satisfactory" and second_grade == "Satisfactory"),
+    )
+
+
+def _add_ai_feedback(session, student_id, module_id, feedback, question_id, grade, attempt):
+    # Keep the summary tables in the same transaction as the feedback row
+    _update_question_stats(session, student_id, module_id, question_id, grade, attempt)
+    new_feedback = AIFeedback(
+        student_id=student_id,
+        module_id=module_id,
+        feedback=feedback,
+        question_id=question_id,
+        grade=grade,
+        attempt=attempt,
+    )
+    session.add(new_feedback)
+
+
+def insert_ai_feedback(student_id, module_id, feedback, question_id, grade=None, attempt=1):
     session = Session()
     try:
-        new_feedback = AIFeedback(student_id=student_id, feedback=feedback, question_id=question_id)
-        session.add(new_feedback)
+        _add_ai_feedback(session, student_id, module_id, feedback, question_id, grade, attempt)
         session.commit()
     except Exception as e:
         print(f"Error inserting AI feedback: {e}")
@@ -119,12 +211,18 @@ def get_current_attempt(student_id):
     finally:
         session.close()
 
-def get_or_create_student(banner_id):
+def get_or_create_student(banner_id, module_id):
     session = Session()
     try:
-        student = session.query(Student).filter_by(banner_id=banner_id).first()
+        student = (
+            session.query(Student)
+            .filter_by(banner_id=banner_id, module_id=module_id)
+            .first()
+        )
         if student is None:
-            new_student = Student(banner_id=banner_id, current_attempt=1)
+            new_student = Student(
+                banner_id=banner_id, module_id=module_id, current_attempt=1
+            )
             session.add(new_student)
             session.commit()
             return new_student.id, new_student.current_attempt, True
@@ -135,9 +233,202 @@ def get_or_create_student(banner_id):
 def update_student_attempt(student_id, new_attempt):
     session = Session()
     try:
-        student = session.query(Student).filter_by(id=student_id).first()
+        # Lock the row so concurrent submissions count a completion once
+        student = session.query(Student).filter_by(id=student_id).with_for_update().first()
         if student:
+            # Moving past an attempt completes it
+            for attempt in range(student.current_attempt or 1, new_attempt):
+                keys = {"module_id": student.module_id, "attempt": attempt}
+                _increment(session, ModuleCompletion, keys, completed_count=1)
             student.current_attempt = new_attempt
             session.commit()
     finally:
-        session.close()
\ No newline at end of file
+        session.close()
+
+
+def get_question_stats(module_id):
+    session = Session()
+    try:
+        return (
+            session.query(QuestionStats)
+            .filter_by(module_id=module_id)
+            .order_by(QuestionStats.question_id, QuestionStats.attempt)
+            .all()
+        )
+    finally:
+        session.close()
+
+
+def get_module_completion(module_id):
+    session = Session()
+    try:
+        rows = session.query(ModuleCompletion).filter_by(module_id=module_id).all()
+        return {row.attempt: row.completed_count for row in rows}
+    finally:
+        session.close()
+
+
+def enqueue_grading_job(student_id, module_id, question_id, user_answer, attempt):
+    session = Session()
+    try:
+        # The partial unique index makes concurrent reruns share one live job
+        key = {
+            "student_id": student_id,
+            "module_id": module_id,
+            "question_id": question_id,
+            "attempt": attempt,
+        }
+        statement = (
+            pg_insert(GradingJob)
+            .values(**key, user_answer=user_answer, status="pending")
+            .on_conflict_do_nothing(
+                index_elements=list(key),
+                index_where=GradingJob.status != "failed",
+            )
+            .returning(GradingJob.id)
+        )
+        job_id = session.execute(statement).scalar()
+        if job_id is None:
+            job_id = (
+                session.query(GradingJob.id)
+                .filter_by(**key)
+                .filter(GradingJob.status != "failed")
+                .scalar()
+            )
+        session.commit()
+        return job_id
+    finally:
+        session.close()
+
+
+def get_student_grading_jobs(student_id, module_id, attempt):
+    """Return the latest grading job per question for a student's attempt.
+
+    Each job gets an ``age_seconds`` attribute measured on the database clock.
+    """
+    session = Session()
+    try:
+        rows = (
+            session.query(
+                GradingJob,
+                func.extract("epoch", func.now() - GradingJob.created_at),
+            )
+            .filter_by(student_id=student_id, module_id=module_id, attempt=attempt)
+            .order_by(GradingJob.id)
+            .all()
+        )
+        jobs = {}
+        for job, age_seconds in rows:
+            job.age_seconds = float(age_seconds)
+            jobs[job.question_id] = job
+        return jobs
+    finally:
+        session.close()
+
+
+def _claimed(session, job):
+    # Matches only while this worker still holds the lease it was given
+    return session.query(GradingJob).filter_by(
+        id=job["id"], status="running", tries=job["tries"]
+    )
+
+
+def claim_grading_job(lease_seconds, max_tries):
+    """Lock the oldest runnable job and mark it running.
+
+    Running jobs whose lease has expired (their worker died) are picked up
+    again until they have been tried max_tries times, then marked failed.
+    Leases use the database clock so workers on different hosts agree.
+    SKIP LOCKED lets any number of workers poll the table at once.
+    """
+    session = Session()
+    try:
+        expired = (GradingJob.status == "running") & (
+            GradingJob.started_at < func.now() - timedelta(seconds=lease_seconds)
+        )
+        session.query(GradingJob).filter(
+            expired, GradingJob.tries >= max_tries
+        ).update(
+            {
+                "status": "failed",
+                "error": "Worker lease expired too many times.",
+                "finished_at": func.now(),
+            },
+            synchronize_session=False,
+        )
+        session.commit()
+
+        job = (
+            session.query(GradingJob)
+            .filter(
+                or_(
+                    GradingJob.status == "pending",
+                    expired & (GradingJob.tries < max_tries),
+                )
+            )
+            .order_by(GradingJob.id)
+            .with_for_update(skip_locked=True)
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = "running"
+        job.started_at = func.now()
+        job.tries += 1
+        claimed = {
+            "id": job.id,
+            "student_id": job.student_id,
+            "module_id": job.module_id,
+            "question_id": job.question_id,
+            "attempt": job.attempt,
+            "user_answer": job.user_answer,
+            "tries": job.tries,
+        }
+        session.commit()
+        return claimed
+    finally:
+        session.close()
+
+
+def complete_grading_job(job, feedback, grade):
+    """Store a claimed job's result; returns False if the lease was lost."""
+    session = Session()
+    try:
+        updated = _claimed(session, job).update(
+            {
+                "status": "done",
+                "feedback": feedback,
+                "grade": grade,
+                "finished_at": func.now(),
+            },
+            synchronize_session=False,
+        )
+        if not updated:
+            session.rollback()
+            return False
+        _add_ai_feedback(
+            session,
+            job["student_id"],
+            job["module_id"],
+            feedback,
+            job["question_id"],
+            grade,
+            job["attempt"],
+        )
+        session.commit()
+        return True
+    finally:
+        session.close()
+
+
+def fail_grading_job(job, error, max_tries):
+    session = Session()
+    try:
+        if job["tries"] >= max_tries:
+            values = {"status": "failed", "error": error, "finished_at": func.now()}
+        else:
+            values = {"status": "pending", "error": error}
+        _claimed(session, job).update(values, synchronize_session=False)
+        session.commit()
+    finally:
+        session.close()
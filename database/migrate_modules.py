@@ -0,0 +1,101 @@
+"""Upgrade an existing database to the current schema.
+
+Adds module_id to questions, answers, students, student_answers and
+ai_feedback (existing rows belong to DEFAULT_MODULE_ID), widens the
+questions primary key to (module_id, question_id) and repoints the
+question foreign keys at it. Also adds the attempt and grade columns to
+ai_feedback and the unique index on live grading jobs. Run before
+starting the app or workers; safe to run more than once:
+
+    python -m database.migrate_modules
+"""
+
+from sqlalchemy import text
+
+from database.models import DEFAULT_MODULE_ID, Base, engine
+
+MODULE_TABLES = ["questions", "answers", "students", "student_answers", "ai_feedback"]
+QUESTION_FK_TABLES = ["answers", "student_answers", "ai_feedback"]
+
+
+def has_column(connection, table_name, column_name):
+    return connection.execute(
+        text(
+            "SELECT 1 FROM INFORMATION_SCHEMA.COLUMNS "
+            "WHERE TABLE_NAME = :table_name AND COLUMN_NAME = :column_name"
+        ),
+        {"table_name": table_name, "column_name": column_name},
+    ).first() is not None
+
+
+def migrate_module_columns(connection):
+    if has_column(connection, "questions", "module_id"):
+        print("Module columns already present. Skipping.")
+        return
+
+    for table_name in MODULE_TABLES:
+        connection.execute(
+            text(
+                f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS module_id "
+                f"VARCHAR(50) NOT NULL DEFAULT '{DEFAULT_MODULE_ID}'"
+            )
+        )
+    for table_name in QUESTION_FK_TABLES:
+        connection.execute(
+            text(f"ALTER TABLE {table_name} DROP CONSTRAINT IF EXISTS {table_name}_question_id_fkey")
+        )
+    connection.execute(text("ALTER TABLE questions DROP CONSTRAINT IF EXISTS questions_pkey"))
+    connection.execute(text("ALTER TABLE questions ADD PRIMARY KEY (module_id, question_id)"))
+    for table_name in QUESTION_FK_TABLES:
+        connection.execute(
+            text(
+                f"ALTER TABLE {table_name} ADD CONSTRAINT {table_name}_module_id_question_id_fkey "
+                "FOREIGN KEY (module_id, question_id) "
+                "REFERENCES questions (module_id, question_id)"
+            )
+        )
+    print(f"Added module columns; existing rows assigned to {DEFAULT_MODULE_ID}.")
+
+
+def migrate_feedback_columns(connection):
+    connection.execute(
+        text(
+            "ALTER TABLE ai_feedback "
+            "ADD COLUMN IF NOT EXISTS attempt INTEGER NOT NULL DEFAULT 1, "
+            "ADD COLUMN IF NOT EXISTS grade VARCHAR(50)"
+        )
+    )
+    connection.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_ai_feedback_student_question "
+            "ON ai_feedback (student_id, module_id, question_id, attempt)"
+        )
+    )
+    print("Ensured ai_feedback attempt and grade columns.")
+
+
+def migrate_grading_jobs(connection):
+    # grading_jobs tables created before the index existed lack it
+    connection.execute(
+        text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_grading_jobs_active "
+            "ON grading_jobs (student_id, module_id, question_id, attempt) "
+            "WHERE status <> 'failed'"
+        )
+    )
+
+
+def main():
+    # One transaction, so a failed upgrade leaves the old schema intact
+    with engine.begin() as connection:
+        migrate_module_columns(connection)
+        migrate_feedback_columns(connection)
+    # Create any tables that could not be created against the old schema
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        migrate_grading_jobs(connection)
+    print("Database migrated.")
+
+
+if __name__ == "__main__":
+    main()
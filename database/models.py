@@ -1,7 +1,9 @@
 import os
 
 from dotenv import load_dotenv
-from sqlalchemy import Column, ForeignKey, Integer, String, Text, create_engine, UniqueConstraint
+from sqlalchemy import (Column, DateTime, ForeignKey, ForeignKeyConstraint,
+                        Index, Integer, String, Text, UniqueConstraint,
+                        create_engine, func, text)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -26,11 +28,15 @@ engine = create_engine(DATABASE_URL)
 Base = declarative_base()
 
 
+DEFAULT_MODULE_ID = "autism_overview"
+
+
 # Define your models
 class Student(Base):
     __tablename__ = "students"
     id = Column(Integer, primary_key=True, autoincrement=True)
     banner_id = Column(String(100), nullable=False)  # Add more fields as necessary
+    module_id = Column(String(50), nullable=False, default=DEFAULT_MODULE_ID)
     current_attempt = Column(Integer, default=1)
 
 
@@ -38,11 +44,16 @@ class StudentAnswer(Base):
     __tablename__ = "student_answers"
     id = Column(Integer, primary_key=True, autoincrement=True)
     student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
-    question_id = Column(
-        String(50), ForeignKey("questions.question_id"), nullable=False
-    )
+    module_id = Column(String(50), nullable=False, default=DEFAULT_MODULE_ID)
+    question_id = Column(String(50), nullable=False)
     answer = Column(Text, nullable=False)
     attempt = Column(Integer, nullable=False, default=1)
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["module_id", "question_id"],
+            ["questions.module_id", "questions.question_id"],
+        ),
+    )
 
 
 
@@ -51,12 +62,21 @@ class AIFeedback(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
     feedback = Column(Text, nullable=False)
-    question_id = Column(
-        String(50), ForeignKey("questions.question_id"), nullable=False
+    module_id = Column(String(50), nullable=False, default=DEFAULT_MODULE_ID)
+    question_id = Column(String(50), nullable=False)
+    attempt = Column(Integer, nullable=False, default=1)
+    grade = Column(String(50))  # "Satisfactory", "Improvement needed" or NULL
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["module_id", "question_id"],
+            ["questions.module_id", "questions.question_id"],
+        ),
+        Index("ix_ai_feedback_student_question", "student_id", "module_id", "question_id", "attempt"),
     )
 
 class Question(Base):
     __tablename__ = "questions"
+    module_id = Column(String(50), primary_key=True, default=DEFAULT_MODULE_ID)
     question_id = Column(String(50), primary_key=True)
     question = Column(Text, nullable=False)
 
@@ -64,14 +84,78 @@ class Question(Base):
 class Answer(Base):
     __tablename__ = "answers"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    question_id = Column(
-        String(50), ForeignKey("questions.question_id"), nullable=False
+    module_id = Column(String(50), nullable=False, default=DEFAULT_MODULE_ID)
+    question_id = Column(String(50), nullable=False)
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["module_id", "question_id"],
+            ["questions.module_id", "questions.question_id"],
+        ),
     )
     answer = Column(Text, nullable=False)
 
 
-# Create tables in the database
-Base.metadata.create_all(engine)
+# Durable queue of retrieval + LLM grading work, consumed by worker.py
+class GradingJob(Base):
+    __tablename__ = "grading_jobs"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
+    module_id = Column(String(50), nullable=False)
+    question_id = Column(String(50), nullable=False)
+    attempt = Column(Integer, nullable=False, default=1)
+    user_answer = Column(Text, nullable=False)
+    status = Column(String(20), nullable=False, default="pending")  # pending, running, done, failed
+    tries = Column(Integer, nullable=False, default=0)
+    feedback = Column(Text)
+    grade = Column(String(50))
+    error = Column(Text)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["module_id", "question_id"],
+            ["questions.module_id", "questions.question_id"],
+        ),
+        Index("ix_grading_jobs_status", "status", "id"),
+        Index("ix_grading_jobs_student_question", "student_id", "module_id", "question_id", "attempt"),
+        # At most one live job per answer; failed jobs may be re-queued
+        Index(
+            "uq_grading_jobs_active",
+            "student_id", "module_id", "question_id", "attempt",
+            unique=True,
+            postgresql_where=text("status <> 'failed'"),
+        ),
+    )
+
+
+# Summary tables, updated incrementally as feedback is inserted
+class QuestionStats(Base):
+    __tablename__ = "question_stats"
+    module_id = Column(String(50), primary_key=True)
+    question_id = Column(String(50), primary_key=True)
+    attempt = Column(Integer, primary_key=True)
+    graded_count = Column(Integer, nullable=False, default=0)
+    passed_count = Column(Integer, nullable=False, default=0)
+    # Attempt 2 only: students graded on both attempts, and those who went
+    # from "Improvement needed" to "Satisfactory"
+    paired_count = Column(Integer, nullable=False, default=0)
+    improved_count = Column(Integer, nullable=False, default=0)
+
+
+class ModuleCompletion(Base):
+    __tablename__ = "module_completion"
+    module_id = Column(String(50), primary_key=True)
+    attempt = Column(Integer, primary_key=True)
+    completed_count = Column(Integer, nullable=False, default=0)
+
+
+# Create tables in the database. On a database that predates a schema change
+# this can fail; run the upgrade scripts (e.g. database.migrate_modules) then.
+try:
+    Base.metadata.create_all(engine)
+except Exception as e:
+    print(f"Error creating tables, the database may need migrating: {e}")
 
 # Create a session
 Session = sessionmaker(bind=engine)
@@ -0,0 +1,101 @@
+"""Backfill AIFeedback.grade and rebuild the analytics summary tables.
+
+The summary tables are normally kept up to date as feedback is inserted.
+Run this once after upgrading an existing database with
+database.migrate_modules, or to repair drift:
+
+    python -m database.rebuild_analytics
+"""
+
+from sqlalchemy import func
+
+from database.models import (AIFeedback, ModuleCompletion, QuestionStats,
+                             Session, Student)
+from utils import parse_grade
+
+
+def backfill_grades(session):
+    rows = session.query(AIFeedback).filter(AIFeedback.grade.is_(None)).all()
+    for row in rows:
+        row.grade = parse_grade(row.feedback)
+    print(f"Backfilled grades for {len(rows)} feedback rows.")
+
+
+def rebuild_question_stats(session):
+    session.query(QuestionStats).delete()
+
+    graded = (
+        session.query(
+            AIFeedback.module_id,
+            AIFeedback.question_id,
+            AIFeedback.attempt,
+            func.count(),
+            func.count().filter(AIFeedback.grade == "Satisfactory"),
+        )
+        .filter(AIFeedback.grade.isnot(None))
+        .group_by(AIFeedback.module_id, AIFeedback.question_id, AIFeedback.attempt)
+    )
+    stats = {}
+    for module_id, question_id, attempt, graded_count, passed_count in graded:
+        stats[(module_id, question_id, attempt)] = QuestionStats(
+            module_id=module_id,
+            question_id=question_id,
+            attempt=attempt,
+            graded_count=graded_count,
+            passed_count=passed_count,
+            paired_count=0,
+            improved_count=0,
+        )
+
+    # Pair each student's first graded answer on attempt 1 with their first
+    # on attempt 2, matching how insert_ai_feedback counts pairs
+    first_grades = {}
+    for row in (
+        session.query(AIFeedback)
+        .filter(AIFeedback.attempt.in_([1, 2]), AIFeedback.grade.isnot(None))
+        .order_by(AIFeedback.id)
+    ):
+        key = (row.student_id, row.module_id, row.question_id)
+        first_grades.setdefault(key, {}).setdefault(row.attempt, row.grade)
+    for (_, module_id, question_id), grades in first_grades.items():
+        if len(grades) < 2:
+            continue
+        stat = stats[(module_id, question_id, 2)]
+        stat.paired_count += 1
+        if grades[1] != "Satisfactory" and grades[2] == "Satisfactory":
+            stat.improved_count += 1
+
+    session.add_all(stats.values())
+    print(f"Rebuilt {len(stats)} question stats rows.")
+
+
+def rebuild_module_completion(session):
+    session.query(ModuleCompletion).delete()
+
+    completion = {}
+    for module_id, current_attempt in session.query(
+        Student.module_id, Student.current_attempt
+    ):
+        for attempt in range(1, current_attempt or 1):
+            completion[(module_id, attempt)] = completion.get((module_id, attempt), 0) + 1
+
+    session.add_all(
+        ModuleCompletion(module_id=module_id, attempt=attempt, completed_count=count)
+        for (module_id, attempt), count in completion.items()
+    )
+    print(f"Rebuilt {len(completion)} module completion rows.")
+
+
+def main():
+    session = Session()
+    try:
+        backfill_grades(session)
+        rebuild_question_stats(session)
+        rebuild_module_completion(session)
+        session.commit()
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
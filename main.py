@@ -1,27 +1,65 @@
 import streamlit as st
-from database.database import (get_ai_feedback, get_student_answers,
-                               insert_ai_feedback, insert_student_answer, 
-                               get_current_attempt, get_or_create_student, 
+from database.database import (enqueue_grading_job, get_or_create_student,
+                               get_student_grading_jobs, insert_student_answer,
                                update_student_attempt)
-from utils import (get_feedback, get_or_create_chroma_collection,
-                   get_relevant_content, load_questions_and_answers, group_question)
+from utils import load_questions_and_answers, group_question
 import time
 
+# Seconds between checks for grading results from the worker pool
+POLL_INTERVAL = 2
+# Stop polling for a job this long after it was queued (e.g. no worker is up)
+FEEDBACK_WAIT_SECONDS = 300
+
 @st.cache_resource
-def initialize_resources(_questions_fp):
-    questions, answers = load_questions_and_answers(_questions_fp)
-    return questions, answers
+def initialize_resources(questions_fp):
+    questions, _ = load_questions_and_answers(questions_fp)
+    return questions
+
+
+def get_first_attempt_questions(module, questions):
+    return {k: v for k, v in questions.items() if k not in module["second_attempt_only"]}
+
+
+def show_first_attempt_feedback(module_id, grouped_questions):
+    """Render attempt-1 answers and feedback from the grading queue.
+
+    Returns True while any feedback is still expected soon.
+    """
+    jobs = get_student_grading_jobs(st.session_state.student_id, module_id, attempt=1)
+    pending = False
+
+    for group_id, group_questions in grouped_questions.items():
+        for q_id, question in group_questions:
+            job = jobs.get(q_id)
+            st.markdown(f"<p style='font-size: 20px; font-weight: bold; color: #00533E;'>Question {q_id}</p>", unsafe_allow_html=True)
+            st.write(question)
+            st.markdown("<p style='font-size: 18px; font-weight: bold; color: #00533E;'>Your Answer:</p>", unsafe_allow_html=True)
+            st.write(job.user_answer if job else "")
+
+            st.markdown("<p style='font-size: 18px; font-weight: bold; color: #00533E;'>AI Feedback:</p>", unsafe_allow_html=True)
+            if job is None:
+                st.write("No feedback generated for blank answer.")
+            elif job.status == "done":
+                st.write(job.feedback)
+            elif job.status == "failed":
+                st.write("Feedback could not be generated for this answer.")
+            elif job.age_seconds < FEEDBACK_WAIT_SECONDS:
+                pending = True
+                st.info("Generating AI feedback...")
+            else:
+                st.info("Feedback is taking longer than expected. It will be available later, at the start of your second attempt.")
 
+            st.markdown("---")
+    return pending
 
-def first_attempt_flow(collection, questions, answers, ai_client):
+
+def first_attempt_flow(module_id, module, questions):
     # Filter questions for first attempt
-    first_attempt_questions = {k: v for k, v in questions.items() if k not in ['6', '7', '8','9']}
+    first_attempt_questions = get_first_attempt_questions(module, questions)
     grouped_questions = group_question(first_attempt_questions)
     
     if "user_answers" not in st.session_state:
         st.session_state.user_answers = {q_id: "" for q_id in first_attempt_questions}
-    if "feedbacks" not in st.session_state:
-        st.session_state.feedbacks = {q_id: "" for q_id in first_attempt_questions}
     if "current_question_group" not in st.session_state:
         st.session_state.current_question_group = list(grouped_questions.keys())[0]
     if "submitted" not in st.session_state:
@@ -49,7 +87,7 @@ def first_attempt_flow(collection, questions, answers, ai_client):
                 )
                 if st.form_submit_button(f"Save Answer for {q_id}"):
                     st.session_state.user_answers[q_id] = user_answer
-                    insert_student_answer(st.session_state.student_id, q_id, user_answer, attempt=1)
+                    insert_student_answer(st.session_state.student_id, module_id, q_id, user_answer, attempt=1)
                     st.success(f"Answer for {q_id} saved!")
 
         # Navigation buttons (outside the form)
@@ -71,6 +109,10 @@ def first_attempt_flow(collection, questions, answers, ai_client):
 
         # Submit all button
         if st.button("Submit Assessment"):
+            # Queue grading before advancing the attempt so a dropped connection can't lose it
+            for q_id, user_answer in st.session_state.user_answers.items():
+                if user_answer.strip():
+                    enqueue_grading_job(st.session_state.student_id, module_id, q_id, user_answer, attempt=1)
             st.session_state.submitted = True
             st.session_state.current_attempt = 2
             update_student_attempt(st.session_state.student_id, 2)
@@ -81,48 +123,20 @@ def first_attempt_flow(collection, questions, answers, ai_client):
         # Display all questions, answers, and generate feedback
         st.markdown("<h2 style='color: #215732;'>Submission Evaluation</h2>", unsafe_allow_html=True)
 
-        for group_id, group_questions in grouped_questions.items():
-            for q_id, question in group_questions:
-                st.markdown(f"<p style='font-size: 20px; font-weight: bold; color: #00533E;'>Question {q_id}</p>", unsafe_allow_html=True)
-                st.write(question)
-                st.markdown("<p style='font-size: 18px; font-weight: bold; color: #00533E;'>Your Answer:</p>", unsafe_allow_html=True)
-                st.write(st.session_state.user_answers[q_id])
-
-                if st.session_state.user_answers[q_id].strip():
-                    if not st.session_state.feedbacks[q_id]:
-                        with st.spinner("Generating AI feedback..."):
-                            relevant_content = get_relevant_content(
-                                collection,
-                                st.session_state.user_answers[q_id],
-                                answers[q_id],
-                                question,
-                            )
-                            feedback = get_feedback(
-                                ai_client,
-                                st.session_state.user_answers[q_id],
-                                question,
-                                relevant_content,
-                                answers[q_id],
-                            )
-                            st.session_state.feedbacks[q_id] = feedback
-                            insert_ai_feedback(st.session_state.student_id, feedback, q_id)
-
-                    st.markdown("<p style='font-size: 18px; font-weight: bold; color: #00533E;'>AI Feedback:</p>", unsafe_allow_html=True)
-                    st.write(st.session_state.feedbacks[q_id])
-                else:
-                    st.markdown("<p style='font-size: 18px; font-weight: bold; color: #00533E;'>AI Feedback:</p>", unsafe_allow_html=True)
-                    st.write("No feedback generated for blank answer.")
-
-                st.markdown("---")
+        pending = show_first_attempt_feedback(module_id, grouped_questions)
 
         st.write("You have completed the first attempt. You can now close the window and return later for your second attempt, or start your second attempt now.")
         if st.button("Start Second Attempt"):
-            for key in ["user_answers", "feedbacks", "current_question_group", "submitted"]:
+            for key in ["user_answers", "current_question_group", "submitted"]:
                 if key in st.session_state:
                     del st.session_state[key]
             st.rerun()
 
-def second_attempt_flow(questions):
+        if pending:
+            time.sleep(POLL_INTERVAL)
+            st.rerun()
+
+def second_attempt_flow(module_id, questions):
     # Include all questions for second attempt
     grouped_questions = group_question(questions)
     
@@ -156,7 +170,7 @@ def second_attempt_flow(questions):
                 )
                 if st.form_submit_button(f"Save Answer for {q_id}"):
                     st.session_state.user_answers[q_id] = user_answer
-                    insert_student_answer(st.session_state.student_id, q_id, user_answer, attempt=2)
+                    insert_student_answer(st.session_state.student_id, module_id, q_id, user_answer, attempt=2)
                     st.success(f"Answer for {q_id} saved!")
 
         # Navigation buttons
@@ -177,6 +191,10 @@ def second_attempt_flow(questions):
                         st.rerun()
 
         if st.button("Submit Assessment"):
+            # Queue the final answers for grading for instructor analytics; no feedback is shown
+            for q_id, user_answer in st.session_state.user_answers.items():
+                if user_answer.strip():
+                    enqueue_grading_job(st.session_state.student_id, module_id, q_id, user_answer, attempt=2)
             st.session_state.submitted = True
             st.session_state.current_attempt = 3
             update_student_attempt(st.session_state.student_id, 3)
@@ -185,8 +203,8 @@ def second_attempt_flow(questions):
     else:
         st.write("You have completed both attempts of the assessment.")
 
-def main(collection, questions_fp, ai_client):
-    questions, answers = initialize_resources(questions_fp)    
+def main(module_id, module):
+    questions = initialize_resources(module["questions_fp"])
     # Brockport green color scheme
     st.markdown(
         """
@@ -220,7 +238,7 @@ def main(collection, questions_fp, ai_client):
         unsafe_allow_html=True,
     )
 
-    st.title("Autism Spectrum Disorder (Part 1): An Overview for Educators")
+    st.title(module["title"])
 
     if "student_id" not in st.session_state:
         st.session_state.student_id = None
@@ -232,7 +250,7 @@ def main(collection, questions_fp, ai_client):
         banner_id = st.text_input("Enter the last four digits of your Banner ID:")
         if st.button("Submit"):
             if banner_id and banner_id.isdigit() and len(banner_id) == 4:
-                student_id, current_attempt, is_new_student = get_or_create_student(banner_id)
+                student_id, current_attempt, is_new_student = get_or_create_student(banner_id, module_id)
                 st.session_state.student_id = student_id
                 st.session_state.current_attempt = current_attempt
                 if is_new_student:
@@ -251,17 +269,22 @@ def main(collection, questions_fp, ai_client):
     if st.session_state.current_attempt == 1:
         st.write("Current attempt: 1")
         st.markdown("<p class='instruction'>Be sure to save your answer before moving to the next question, or you will lose your progress. Answers will only be saved for this current active session, and they will only be submitted after you have clicked the 'Submit Assessment' button.</p>", unsafe_allow_html=True)
-        first_attempt_flow(collection, questions, answers, ai_client)
+        first_attempt_flow(module_id, module, questions)
     elif st.session_state.current_attempt == 2:
         if "submitted" in st.session_state and st.session_state.submitted:
             # If the first attempt was just submitted, show the feedback
             st.write("First attempt feedback:")
-            first_attempt_flow(collection, questions, answers, ai_client)
+            first_attempt_flow(module_id, module, questions)
         else:
-            # Otherwise, start the second attempt
+            # Otherwise, start the second attempt. Feedback from the first
+            # attempt is loaded from the grading queue, so it survives reconnects.
             st.write("Current attempt: 2")
+            with st.expander("First attempt feedback"):
+                first_attempt_questions = get_first_attempt_questions(module, questions)
+                if show_first_attempt_feedback(module_id, group_question(first_attempt_questions)):
+                    st.write("Some feedback is still being generated. Reload the page to check again.")
             st.markdown("<p class='instruction'>Be sure to save your answer before moving to the next question, or you will lose your progress. Answers will only be saved for this current active session, and they will only be submitted after you have clicked the 'Submit Assessment' button.</p>", unsafe_allow_html=True)
-            second_attempt_flow(questions)
+            second_attempt_flow(module_id, questions)
     else:
         st.write("You have completed both attempts of the assessment.")
         # Display a summary or final message here
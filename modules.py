@@ -0,0 +1,89 @@
+import os
+from collections import OrderedDict
+
+import yaml
+
+from utils import CHUNK_SIZE, get_or_create_chroma_collection
+
+# Rough per-chunk footprint of an open collection: one ada-002 embedding
+# (1536 float32 values) plus the chunk text.
+EMBEDDING_DIMENSIONS = 1536
+ESTIMATED_BYTES_PER_CHUNK = EMBEDDING_DIMENSIONS * 4 + CHUNK_SIZE
+
+
+def load_module_registry(registry_fp="modules.yaml"):
+    with open(registry_fp, "r") as file:
+        registry = yaml.safe_load(file)
+
+    # Prebuilt vector artifacts, baked into the image or on a shared path
+    artifacts_dir = os.getenv(
+        "VECTOR_ARTIFACTS_PATH", registry.get("artifacts_dir", "Vector_Artifacts")
+    )
+    for module_id, module in registry["modules"].items():
+        module.setdefault("collection_name", f"module_{module_id}")
+        module.setdefault("second_attempt_only", [])
+        module.setdefault("artifact_dir", os.path.join(artifacts_dir, module_id))
+    return registry
+
+
+def get_module(registry, module_id=None):
+    module_id = module_id or registry["default_module"]
+    if module_id not in registry["modules"]:
+        raise KeyError(f"Unknown module: {module_id}")
+    return module_id, registry["modules"][module_id]
+
+
+class ModuleCollectionCache:
+    """Opens module collections on first use and evicts idle ones.
+
+    Collections are kept in least-recently-used order. Once the estimated
+    size of the open collections exceeds ``memory_limit_bytes`` the oldest
+    ones are deleted from the (in-memory) client, always keeping the
+    collection that was just requested.
+
+    Not thread-safe: each worker process owns one cache and uses it from a
+    single thread, so an evicted collection is never still being queried.
+    """
+
+    def __init__(self, db_client, ai_client, registry, memory_limit_bytes):
+        self.db_client = db_client
+        self.ai_client = ai_client
+        self.registry = registry
+        self.memory_limit_bytes = memory_limit_bytes
+        self._collections = OrderedDict()
+
+    def get(self, module_id):
+        if module_id in self._collections:
+            self._collections.move_to_end(module_id)
+            return self._collections[module_id][0]
+
+        _, module = get_module(self.registry, module_id)
+        collection = get_or_create_chroma_collection(
+            self.db_client,
+            module["content_fp"],
+            self.ai_client,
+            module["collection_name"],
+            module["artifact_dir"],
+        )
+        size = collection.count() * ESTIMATED_BYTES_PER_CHUNK
+        self._collections[module_id] = (collection, size)
+        self._evict()
+        return collection
+
+    def warm(self, module_ids):
+        """Open modules up front, stopping once the memory limit is reached."""
+        for module_id in module_ids:
+            if self._total_size() >= self.memory_limit_bytes:
+                break
+            self.get(module_id)
+
+    def _total_size(self):
+        return sum(size for _, size in self._collections.values())
+
+    def _evict(self):
+        total = self._total_size()
+        while total > self.memory_limit_bytes and len(self._collections) > 1:
+            module_id, (collection, size) = self._collections.popitem(last=False)
+            self.db_client.delete_collection(name=collection.name)
+            total -= size
+            print(f"Evicted collection for module {module_id}.")
@@ -0,0 +1,91 @@
+import csv
+import io
+import os
+
+import streamlit as st
+from dotenv import load_dotenv
+
+from database.database import get_module_completion, get_question_stats
+from modules import load_module_registry
+
+st.set_page_config(
+    page_title="Instructor Analytics",
+    page_icon="🦅",
+    layout="wide")
+
+load_dotenv()
+
+
+def build_report(module_id):
+    # Both queries read the pre-aggregated summary tables only
+    stats = get_question_stats(module_id)
+    completion = get_module_completion(module_id)
+
+    rows = {}
+    for stat in stats:
+        row = rows.setdefault(stat.question_id, {"question_id": stat.question_id})
+        pass_rate = stat.passed_count / stat.graded_count if stat.graded_count else None
+        row[f"attempt_{stat.attempt}_graded"] = stat.graded_count
+        row[f"attempt_{stat.attempt}_pass_rate"] = pass_rate
+        if stat.attempt == 2:
+            row["improved"] = stat.improved_count
+            row["improvement_rate"] = (
+                stat.improved_count / stat.paired_count if stat.paired_count else None
+            )
+    return list(rows.values()), completion
+
+
+def to_csv(rows):
+    fieldnames = [
+        "question_id",
+        "attempt_1_graded",
+        "attempt_1_pass_rate",
+        "attempt_2_graded",
+        "attempt_2_pass_rate",
+        "improved",
+        "improvement_rate",
+    ]
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=fieldnames)
+    writer.writeheader()
+    writer.writerows(rows)
+    return output.getvalue()
+
+
+st.title("Instructor Analytics")
+
+password = os.getenv("INSTRUCTOR_PASSWORD")
+if not password:
+    st.error("Set INSTRUCTOR_PASSWORD to enable instructor analytics.")
+    st.stop()
+if st.text_input("Instructor password:", type="password") != password:
+    st.stop()
+
+registry = load_module_registry()
+module_ids = list(registry["modules"])
+module_id = st.selectbox(
+    "Module",
+    module_ids,
+    index=module_ids.index(registry["default_module"]),
+    format_func=lambda m: registry["modules"][m]["title"],
+)
+
+rows, completion = build_report(module_id)
+
+col1, col2 = st.columns(2)
+col1.metric("Completed attempt 1", completion.get(1, 0))
+col2.metric("Completed attempt 2", completion.get(2, 0))
+
+st.subheader("Per-question results")
+st.caption(
+    "Improvement rate is the share of students graded on both attempts who went "
+    "from \"Improvement needed\" to \"Satisfactory\"."
+)
+st.dataframe(rows, use_container_width=True)
+
+st.download_button(
+    "Export CSV",
+    to_csv(rows),
+    file_name=f"{module_id}_analytics.csv",
+    mime="text/csv",
+)
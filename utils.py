@@ -1,9 +1,10 @@
+import gzip
+import hashlib
 import json
 import os
+from datetime import datetime, timezone
 
-import chromadb
 import PyPDF2
-import streamlit as st
 import yaml
 from chromadb.utils import embedding_functions
 from openai import OpenAI
@@ -18,18 +19,26 @@ def extract_text_from_pdf(pdf_path):
     return text
 
 
+EMBEDDING_MODEL = "text-embedding-ada-002"
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 200
+
+# Bump when the artifact layout or chunking changes
+ARTIFACT_FORMAT_VERSION = 1
+ARTIFACT_MANIFEST = "manifest.json"
+ARTIFACT_DATA = "data.json.gz"
+
+
 def embed_content_in_chunks(content, ai_client):
-    chunk_size = 800
-    chunk_overlap = 200
     chunks = [
-        content[i : i + chunk_size]
-        for i in range(0, len(content), chunk_size - chunk_overlap)
+        content[i : i + CHUNK_SIZE]
+        for i in range(0, len(content), CHUNK_SIZE - CHUNK_OVERLAP)
     ]
 
     embeddings = []
     for chunk in chunks:
         response = ai_client.embeddings.create(
-            input=chunk, model="text-embedding-ada-002"
+            input=chunk, model=EMBEDDING_MODEL
         )
         embeddings.append(response.data[0].embedding)
     return chunks, embeddings
@@ -97,6 +106,16 @@ def get_feedback(ai_client, user_answer, question, relevant_content, actual_answ
 
     feedback = feedback_response.choices[0].message.content.strip()
 
+    grade = get_grade(ai_client, user_answer, question, actual_answer, prompts)
+
+    # Combine feedback and grade
+    formatted_response = f"**Feedback:** {feedback}\n\n**Grade:** {grade}"
+    return formatted_response, parse_grade(grade)
+
+
+def get_grade(ai_client, user_answer, question, actual_answer, prompts=None):
+    prompts = prompts or load_prompts()
+
     # Prepare the grading prompt
     grading_prompt = prompts["grading_prompt"].format(
         question=question,
@@ -122,41 +141,158 @@ def get_feedback(ai_client, user_answer, question, relevant_content, actual_answ
         max_tokens=5,
     )
 
-    grade = grading_response.choices[0].message.content.strip()
+    return grading_response.choices[0].message.content.strip()
 
-    # Combine feedback and grade
-    formatted_response = f"**Feedback:** {feedback}\n\n**Grade:** {grade}"
-    return formatted_response
 
+GRADES = ("Satisfactory", "Improvement needed")
 
 
+def parse_grade(text):
+    """Normalize a model grade, or a formatted feedback string, to one of GRADES."""
+    if "**Grade:**" in text:
+        text = text.rsplit("**Grade:**", 1)[1]
+    text = text.strip().strip(".\"'*").lower()
+    for grade in GRADES:
+        if text.startswith(grade.lower()):
+            return grade
+    # max_tokens=5 can truncate "Improvement needed"
+    if text.startswith("improvement"):
+        return "Improvement needed"
+    return None
 
-@st.cache_resource
-def get_or_create_chroma_collection(_db_client, module_content_fp, _ai_client):
-    collection_name = "module_content"
 
-    embedding_function = embedding_functions.OpenAIEmbeddingFunction(
-        api_key=os.getenv("OPENAI_API_KEY"), model_name="text-embedding-ada-002"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def expected_artifact_metadata(module_content_fp):
+    return {
+        "format_version": ARTIFACT_FORMAT_VERSION,
+        "source_sha256": file_sha256(module_content_fp),
+        "embedding_model": EMBEDDING_MODEL,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+    }
+
+
+def _embed_module(module_content_fp, ai_client):
+    pdf_text = extract_text_from_pdf(module_content_fp)
+    chunks, embeddings = embed_content_in_chunks(pdf_text, ai_client)
+    return {
+        "ids": [f"embedding_{i}" for i in range(len(embeddings))],
+        "documents": chunks,
+        "embeddings": embeddings,
+    }
+
+
+def build_vector_artifact(module_content_fp, ai_client, artifact_dir):
+    data = _embed_module(module_content_fp, ai_client)
+    return write_vector_artifact(module_content_fp, data, artifact_dir)
+
+
+def write_vector_artifact(module_content_fp, data, artifact_dir):
+    # Write to temporary files and rename, so readers never see a partial
+    # artifact; the manifest goes last so it only ever describes valid data
+    os.makedirs(artifact_dir, exist_ok=True)
+    data_fp = os.path.join(artifact_dir, ARTIFACT_DATA)
+    with gzip.open(data_fp + ".tmp", "wt") as file:
+        json.dump(data, file)
+    os.replace(data_fp + ".tmp", data_fp)
+
+    manifest = expected_artifact_metadata(module_content_fp)
+    manifest.update(
+        {
+            "source_file": os.path.basename(module_content_fp),
+            "chunk_count": len(data["ids"]),
+            "data_sha256": file_sha256(data_fp),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
     )
+    manifest_fp = os.path.join(artifact_dir, ARTIFACT_MANIFEST)
+    with open(manifest_fp + ".tmp", "w") as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(manifest_fp + ".tmp", manifest_fp)
+    return manifest
+
+
+def load_vector_artifact(artifact_dir, expected_metadata):
+    """Return the artifact data, or None if it is missing or does not match."""
+    manifest_fp = os.path.join(artifact_dir, ARTIFACT_MANIFEST)
+    data_fp = os.path.join(artifact_dir, ARTIFACT_DATA)
+    if not os.path.exists(manifest_fp):
+        print(f"No vector artifact found in {artifact_dir}.")
+        return None
+
+    with open(manifest_fp, "r") as file:
+        manifest = json.load(file)
+    for key, value in expected_metadata.items():
+        if manifest.get(key) != value:
+            print(f"Vector artifact in {artifact_dir} is stale: {key} does not match.")
+            return None
+    if not os.path.exists(data_fp) or file_sha256(data_fp) != manifest["data_sha256"]:
+        print(f"Vector artifact in {artifact_dir} failed its checksum.")
+        return None
+
+    with gzip.open(data_fp, "rt") as file:
+        return json.load(file)
+
+
+def load_or_build_vector_artifact(module_content_fp, ai_client, artifact_dir):
+    """Return validated artifact data, building the artifact if it is missing or stale.
+
+    Building holds an exclusive lock on the artifact directory, so processes
+    and containers sharing it embed the PDF once and the rest wait for it.
+    """
+    expected_metadata = expected_artifact_metadata(module_content_fp)
+    data = load_vector_artifact(artifact_dir, expected_metadata)
+    if data is not None:
+        return data
+
+    import fcntl  # POSIX-only, so only imported when an artifact must be built
 
     try:
-        collection = _db_client.get_collection(
-            name=collection_name, embedding_function=embedding_function
-        )
-        print("Using existing ChromaDB collection.")
-    except chromadb.errors.InvalidCollectionException:
-        print("No existing ChromaDB collection found. Creating a new one...")
-        pdf_text = extract_text_from_pdf(module_content_fp)
-        chunks, embeddings = embed_content_in_chunks(pdf_text, _ai_client)
-        collection = _db_client.create_collection(
-            name=collection_name, embedding_function=embedding_function
-        )
-        collection.add(
-            documents=chunks,
-            embeddings=embeddings,
-            ids=[f"embedding_{i}" for i in range(len(embeddings))],
-        )
-        print("New collection created and embeddings added to ChromaDB.")
+        os.makedirs(artifact_dir, exist_ok=True)
+        lock_file = open(os.path.join(artifact_dir, ".lock"), "w")
+    except OSError as e:
+        # Read-only artifact path: embed for this process only
+        print(f"WARNING: cannot write vector artifact to {artifact_dir} ({e}). Embedding in memory.")
+        return _embed_module(module_content_fp, ai_client)
+
+    with lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        data = load_vector_artifact(artifact_dir, expected_metadata)
+        if data is None:
+            print(f"Embedding module content from the source PDF into {artifact_dir}.")
+            data = _embed_module(module_content_fp, ai_client)
+            try:
+                write_vector_artifact(module_content_fp, data, artifact_dir)
+            except OSError as e:
+                # Keep the embeddings for this process rather than embedding again
+                print(f"WARNING: could not save vector artifact to {artifact_dir} ({e}).")
+    return data
+
+
+def get_or_create_chroma_collection(_db_client, module_content_fp, _ai_client, collection_name, artifact_dir):
+    """Load a module's artifact into ``_db_client``, normally a per-process
+    EphemeralClient, so processes never share on-disk Chroma state."""
+    embedding_function = embedding_functions.OpenAIEmbeddingFunction(
+        api_key=os.getenv("OPENAI_API_KEY"), model_name=EMBEDDING_MODEL
+    )
+    data = load_or_build_vector_artifact(module_content_fp, _ai_client, artifact_dir)
+
+    collection = _db_client.get_or_create_collection(
+        name=collection_name, embedding_function=embedding_function
+    )
+    collection.upsert(
+        documents=data["documents"], embeddings=data["embeddings"], ids=data["ids"]
+    )
+    print(f"Loaded {len(data['ids'])} embeddings into ChromaDB collection {collection_name}.")
 
     return collection
 
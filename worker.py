@@ -0,0 +1,138 @@
+"""Grading worker: runs retrieval and LLM grading jobs from the grading_jobs table.
+
+    python worker.py --processes 4
+
+Run as many worker containers as needed; jobs are claimed with
+SELECT ... FOR UPDATE SKIP LOCKED, and a result is only stored while the
+worker still holds the job's lease, so each job is recorded once.
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+
+import chromadb
+from dotenv import load_dotenv
+from openai import OpenAI
+
+from database.database import (claim_grading_job, complete_grading_job,
+                               fail_grading_job)
+from modules import ModuleCollectionCache, get_module, load_module_registry
+from utils import (get_feedback, get_grade, get_relevant_content,
+                   load_questions_and_answers, parse_grade)
+
+
+def grade_job(job, registry, collection_cache, ai_client, question_banks):
+    _, module = get_module(registry, job["module_id"])
+    if job["module_id"] not in question_banks:
+        question_banks[job["module_id"]] = load_questions_and_answers(module["questions_fp"])
+    questions, answers = question_banks[job["module_id"]]
+    question = questions[job["question_id"]]
+    actual_answer = answers[job["question_id"]]
+
+    # Second attempts are only graded; feedback is not shown to the student
+    if job["attempt"] > 1:
+        grade = get_grade(ai_client, job["user_answer"], question, actual_answer)
+        return f"**Grade:** {grade}", parse_grade(grade)
+
+    collection = collection_cache.get(job["module_id"])
+    relevant_content = get_relevant_content(
+        collection, job["user_answer"], actual_answer, question
+    )
+    return get_feedback(
+        ai_client, job["user_answer"], question, relevant_content, actual_answer
+    )
+
+
+def run_worker(worker_id, args):
+    load_dotenv()
+    ai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    registry = load_module_registry(args.registry)
+    memory_limit_bytes = registry["collection_memory_limit_bytes"]
+    # Each process holds its own in-memory copy of the vector artifacts,
+    # so there is no shared on-disk Chroma state between processes
+    db_client = chromadb.EphemeralClient()
+    collection_cache = ModuleCollectionCache(
+        db_client, ai_client, registry, memory_limit_bytes
+    )
+    question_banks = {}
+
+    # Validate and load collections before taking jobs
+    collection_cache.warm(registry["modules"])
+    print(f"Worker {worker_id} started.")
+    while True:
+        try:
+            job = claim_grading_job(args.lease_seconds, args.max_tries)
+        except Exception as e:
+            # Database restart, failover or dropped connection: back off and retry
+            print(f"Worker {worker_id} could not claim a job: {e}")
+            time.sleep(args.error_backoff)
+            continue
+        if job is None:
+            time.sleep(args.poll_interval)
+            continue
+        try:
+            feedback, grade = grade_job(
+                job, registry, collection_cache, ai_client, question_banks
+            )
+            if complete_grading_job(job, feedback, grade):
+                print(f"Worker {worker_id} finished job {job['id']}.")
+            else:
+                print(f"Worker {worker_id} lost the lease on job {job['id']}; result discarded.")
+        except Exception as e:
+            print(f"Worker {worker_id} failed job {job['id']}: {e}")
+            try:
+                fail_grading_job(job, str(e), args.max_tries)
+            except Exception as e:
+                # The lease will expire and the job will be claimed again
+                print(f"Worker {worker_id} could not record failure of job {job['id']}: {e}")
+                time.sleep(args.error_backoff)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run grading workers.")
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=int(os.getenv("GRADING_WORKERS", "2")),
+        help="Number of worker processes (default: $GRADING_WORKERS or 2).",
+    )
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument(
+        "--lease-seconds",
+        type=int,
+        default=300,
+        help="Re-queue running jobs whose worker has not finished them in this time.",
+    )
+    parser.add_argument("--max-tries", type=int, default=3)
+    parser.add_argument(
+        "--error-backoff",
+        type=float,
+        default=5.0,
+        help="Seconds to wait after a database error.",
+    )
+    parser.add_argument("--registry", default="modules.yaml")
+    args = parser.parse_args()
+
+    # Spawn rather than fork so each process opens its own database connections
+    context = multiprocessing.get_context("spawn")
+
+    def start_worker(worker_id):
+        process = context.Process(target=run_worker, args=(worker_id, args))
+        process.start()
+        return process
+
+    processes = {worker_id: start_worker(worker_id) for worker_id in range(args.processes)}
+
+    # Keep the pool at full size: respawn any worker process that exits
+    while True:
+        time.sleep(args.error_backoff)
+        for worker_id, process in processes.items():
+            if not process.is_alive():
+                print(f"Worker {worker_id} exited with code {process.exitcode}; restarting.")
+                processes[worker_id] = start_worker(worker_id)
+
+
+if __name__ == "__main__":
+    main()